@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import collections
+import functools
+import heapq
 import os
+import statistics
 import time
 import tomllib
 import hashlib
@@ -12,14 +16,116 @@ import random
 import string
 import re
 from datetime import datetime
-from typing import Dict, List, Set
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
 import aiohttp
+import orjson
+import tomli_w
 from loguru import logger
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis为可选依赖，未安装时通知去重仅在进程内生效
+    aioredis = None
+
 from WechatAPI import WechatAPIClient
 from utils.decorators import on_text_message, on_image_message, scheduler
 from utils.plugin_base import PluginBase
 
+# 消息中的wxid
+_WXID_RE = re.compile(r'wxid_\w+')
+_HB_RE = re.compile(r'Heartbeat failed for wxid (wxid_\w+)')
+# 心跳失败关键字（与小写后的文本比较）
+_HB_KEYWORDS = ("心跳失败", "heartbeat failed", "用户可能退出")
+# 离线提示关键字
+_OFFLINE_KEYWORDS = ("已退出", "离线", "不在线", "登录异常")
+
+# 插件自己写入心跳错误文件的行前缀（与_classify返回的原因一致），扫描时跳过
+_OWN_LINE_PREFIXES = ("初始化心跳错误日志", "日志消息心跳失败", "系统消息心跳失败", "错误消息", "系统消息提示离线", "检测到消息失败")
+# 心跳错误日志中的失败行，提取行内第一个wxid
+_ERR_LINE_RE = re.compile(r'^(?=.*(?:心跳失败|Heartbeat failed|用户可能退出)).*?(wxid_\w+)')
+# 心跳错误日志行内的时间戳，兼容 YYYY/MM/DD 与 YYYY-MM-DD 两种写法
+_TS_RE = re.compile(r'\d{4}[/-]\d{2}[/-]\d{2} \d{2}:\d{2}:\d{2}')
+
+# 自适应心跳：至少积累多少次耗时样本后才允许延长检查间隔
+_HB_MIN_SAMPLES = 8
+# 自适应心跳：耗时方差低于该值(秒²)时认为链路稳定
+_HB_RTT_VAR_MAX = 0.25
+
+# API状态探测间隔(秒)：健康时逐步放宽到HEALTHY，异常后立即缩短为DEGRADED
+_PROBE_HEALTHY_INTERVAL = 5.0
+_PROBE_DEGRADED_INTERVAL = 1.0
+
+# 持续离线用户的提醒间隔(秒)
+_OFFLINE_REMIND_INTERVAL = 2 * 3600
+
+# 消息模板中支持的变量
+_PLACEHOLDER_RE = re.compile(r'\{(wxid|time|date|hour|bot_name|bot_wxid)\}')
+
+# 时间类变量的格式
+_TIME_FORMATS = {"time": "%Y-%m-%d %H:%M:%S", "date": "%Y-%m-%d", "hour": "%H:%M"}
+
+# 纯文本模板中需要去掉的HTML标签
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# 模板ID -> 保存模板的属性名
+_TEMPLATE_ATTRS = {
+    "title": "title_template",
+    "content": "content_template",
+    "test_title": "test_title_template",
+    "test_content": "test_content_template",
+}
+
+def _parse_ts(s: str) -> float:
+    """解析固定格式 YYYY/MM/DD HH:MM:SS 的时间戳，格式不符时回退到strptime"""
+    try:
+        return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                        int(s[11:13]), int(s[14:16]), int(s[17:19])).timestamp()
+    except ValueError:
+        return datetime.strptime(s.replace("-", "/"), "%Y/%m/%d %H:%M:%S").timestamp()
+
+# 按wxid记录的状态表最多保留的条目数
+_LRU_CAPACITY = 1024
+
+
+class _LRU(collections.OrderedDict):
+    """容量有限的字典，写入时淘汰最久未写入的条目"""
+
+    def __init__(self, cap: int = _LRU_CAPACITY):
+        super().__init__()
+        self.cap = cap
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.move_to_end(key)
+        super().__setitem__(key, value)
+        while len(self) > self.cap:
+            self.popitem(last=False)
+
+
+class _LazyVars(dict):
+    """模板变量字典，时间和机器人信息在首次引用时才计算并缓存"""
+
+    def __init__(self, plugin, wxid):
+        super().__init__(wxid=wxid)
+        self._plugin = plugin
+        self._now = None
+
+    def __missing__(self, key):
+        if key in _TIME_FORMATS:
+            # 同一次渲染中的时间变量共用一次localtime
+            if self._now is None:
+                self._now = time.localtime()
+            value = time.strftime(_TIME_FORMATS[key], self._now)
+        elif key == "bot_name":
+            value = getattr(self._plugin, "bot_name", "微信机器人")
+        elif key == "bot_wxid":
+            value = self._plugin.current_wxid
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+
 class SMSNotifier(PluginBase):
     description = "通过PushPlus通知微信离线用户"
     author = "老夏的金库"
@@ -84,6 +190,7 @@ class SMSNotifier(PluginBase):
         self.pushplus_channel = "wechat"  # 默认为微信公众号，也可以是"sms"短信
         self.pushplus_template = "html"   # 默认模板
         self.pushplus_topic = ""          # 群组编码，不填仅发送给自己
+        self._rebuild_pushplus_base()
         
         # 通知配置
         self.check_interval = 300  # 检查间隔，单位:秒
@@ -92,21 +199,66 @@ class SMSNotifier(PluginBase):
         
         # 用户配置
         self.users: Dict[str, str] = {}  # wxid -> phone_number/微信令牌
+        self._sole_user_wxid: Optional[str] = None  # 只监控一个用户时的wxid
         self.current_wxid = ""  # 当前微信ID
+        self._wxid_event = asyncio.Event()  # 获取到当前微信ID时置位
         
         # 状态记录
         self.offline_users: Set[str] = set()  # 记录已经离线的用户wxid
-        self.notification_sent: Dict[str, float] = {}  # wxid -> 上次发送短信的时间戳
+        self.notification_sent: Dict[str, float] = _LRU()  # wxid -> 上次发送短信的时间戳
         self.heartbeat_failures: Dict[str, List[float]] = {}  # wxid -> 列表[失败时间戳]
         self.heartbeat_threshold = 3  # 连续心跳失败次数阈值
         self.last_log_position = 0  # 上次读取日志的位置
+        self._err_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")  # 心跳错误文件路径
+        self._err_fp: Optional[BinaryIO] = None  # 心跳错误文件的常驻读取句柄
+        self._err_queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)  # 待写入心跳错误文件的行
+        self._err_writer_task: Optional[asyncio.Task] = None  # 心跳错误文件写入任务
+        self._recent_failures: Dict[str, float] = _LRU(256)  # wxid -> 最近一次处理故障的时间
+        self._seen_log_ts: Dict[str, float] = _LRU()  # wxid -> 已处理的最新错误日志时间戳
         self.last_detected_wxid = None  # 用于保存最近检测到的wxid
+        self._rtt_buf = collections.deque(maxlen=32)  # 最近成功心跳的耗时
+        self._hb_period = self.check_interval  # 当前自适应检查间隔
+        self._schedule: List[Tuple[float, str]] = []  # 调度堆: (下次检查时间, wxid)
+        self._scheduled: Set[str] = set()  # 已在调度堆中的wxid
+        self._probe_interval = _PROBE_DEGRADED_INTERVAL  # 当前API状态探测间隔
+        
+        # 渲染结果缓存，同一分钟内同一用户的重试和重复通知复用渲染结果
+        self._render_cached = functools.lru_cache(maxsize=256)(self._render_template)
         
         # 加载配置
+        self._config_path = os.path.join(os.path.dirname(__file__), "config.toml")
         self._load_config()
         
         # 检查和发送线程
         self.check_task = None
+        
+        # async_init创建的后台任务，禁用时统一取消；禁用后不再创建会话和连接
+        self._bg_tasks: List[asyncio.Task] = []
+        self._closed = False
+        
+        # 命令 -> 处理函数
+        self._commands = {
+            "sms_test": self._do_test,
+            "sms_reload": self._do_reload,
+            "sms_status": self._do_status,
+            "sms_set_wxid": self._do_set_wxid,
+            "sms_heartbeat": self._do_heartbeat,
+            "sms_monitor": self._do_monitor,
+            "sms_unmonitor": self._do_unmonitor,
+            "sms_channel": self._do_channel,
+            "sms_template": self._do_template,
+        }
+        
+        # 共享的HTTP会话，在async_init中创建
+        self._http: Optional[aiohttp.ClientSession] = None
+        
+        # 通知去重：配置redis_url时跨进程共享，否则退回进程内字典
+        self._redis = None
+        self._redis_url_active = ""
+        self._last_notification_time: Dict[str, float] = _LRU()
+        
+        # 管理员列表缓存：按main_config.toml的mtime失效，30秒内不再stat
+        self._admin_cache = {"mtime": 0, "admins": frozenset(), "expires": 0}
     
     def _format_notification_template(self, text_config):
         """格式化通知模板"""
@@ -141,29 +293,54 @@ class SMSNotifier(PluginBase):
         </div>
         """
 
-    def _load_config(self):
-        """加载配置"""
-        config_path = os.path.join(os.path.dirname(__file__), "config.toml")
+    def _format_plain_template(self, text_config):
+        """格式化纯文本模板，用于非HTML的PushPlus模板"""
+        return "\n".join(_HTML_TAG_RE.sub("", value) for value in text_config.values())
+
+    @staticmethod
+    def _read_config_sync(config_path):
+        """读取并解析TOML配置文件（阻塞）"""
+        with open(config_path, "rb") as f:
+            return tomllib.load(f)
+
+    @staticmethod
+    def _write_config_sync(config_path, config_data):
+        """将配置写回TOML配置文件（阻塞）"""
+        with open(config_path, "wb") as f:
+            tomli_w.dump(config_data, f)
+
+    def _load_config(self, config: Optional[dict] = None):
+        """加载配置，未传入config时同步读取配置文件"""
+        config_path = self._config_path
         
         # 默认配置
         self.enable = False
         self.debug = False
         self.users = {}
+        self._refresh_sole_user()
         self.current_wxid = ""
+        self.redis_url = ""
+        self.dedupe_window = 60
+        self._pushplus_sem = asyncio.Semaphore(8)
+        self._schedule = []
+        self._scheduled = set()
         
         # 默认消息模板
         self.title_template = "微信离线通知 - {time}"
         self.notification_text = self._default_notification_text.copy()
         self.test_title_template = "测试通知 - {time}"
         self.test_text = self._default_test_text.copy()
+        self.content_template = self._format_notification_template(self.notification_text)
+        self.test_content_template = self._format_test_template(self.test_text)
         
-        if not os.path.exists(config_path):
+        if config is None and not os.path.exists(config_path):
             logger.warning(f"配置文件不存在: {config_path}")
+            self._compile_templates()
             return
             
         try:
-            with open(config_path, "rb") as f:
-                config = tomllib.load(f)
+            if config is None:
+                config = self._read_config_sync(config_path)
             
             # 基础配置
             basic_config = config.get("basic", {})
@@ -177,6 +354,16 @@ class SMSNotifier(PluginBase):
             self.pushplus_channel = pushplus_config.get("channel", "wechat")
             self.pushplus_template = pushplus_config.get("template", "html")
             self.pushplus_topic = pushplus_config.get("topic", "")
+            self._rebuild_pushplus_base()
+            # 同时进行的PushPlus请求上限，避免故障风暴时触发限流
+            raw_concurrency = pushplus_config.get("concurrency", 8)
+            try:
+                concurrency = int(raw_concurrency)
+            except (TypeError, ValueError):
+                concurrency = 0
+            if concurrency < 1:
+                logger.warning(f"PushPlus并发数配置无效: {raw_concurrency!r}，已改为1")
+            self._pushplus_sem = asyncio.Semaphore(max(1, concurrency))
             
             # 通知配置
             notification_config = config.get("notification", {})
@@ -184,6 +371,9 @@ class SMSNotifier(PluginBase):
             self.retry_times = notification_config.get("retry_times", 3)
             self.retry_interval = notification_config.get("retry_interval", 60)
             self.heartbeat_threshold = notification_config.get("heartbeat_threshold", 3)
+            self.dedupe_window = notification_config.get("dedupe_window", 60)
+            self.redis_url = notification_config.get("redis_url", "")
+            self._hb_period = self.check_interval
             
             # 消息模板配置
             message_config = config.get("message", {})
@@ -206,13 +396,18 @@ class SMSNotifier(PluginBase):
                 if key in test_text:
                     self.test_text[key] = test_text[key]
             
-            # 生成完整的HTML模板
-            self.content_template = self._format_notification_template(self.notification_text)
-            self.test_content_template = self._format_test_template(self.test_text)
+            # 生成完整的模板，非HTML模板只发送精简的纯文本
+            if self.pushplus_template == "html":
+                self.content_template = self._format_notification_template(self.notification_text)
+                self.test_content_template = self._format_test_template(self.test_text)
+            else:
+                self.content_template = self._format_plain_template(self.notification_text)
+                self.test_content_template = self._format_plain_template(self.test_text)
             
             # 用户配置
             if self.current_wxid:
                 self.users = {self.current_wxid: ""}
+                self._refresh_sole_user()
                 logger.info(f"已添加当前微信ID {self.current_wxid} 到监控列表")
             else:
                 logger.warning("未设置current_wxid，无法监控用户")
@@ -229,37 +424,66 @@ class SMSNotifier(PluginBase):
         except Exception as e:
             logger.error(f"加载SMSNotifier配置文件失败: {str(e)}")
             self.enable = False
+        
+        self._compile_templates()
+
+    def _refresh_sole_user(self):
+        """self.users变更后调用，缓存唯一监控用户"""
+        self._sole_user_wxid = next(iter(self.users)) if len(self.users) == 1 else None
+
+    def _compile_templates(self):
+        """预先按变量拆分所有模板，并丢弃旧的渲染结果"""
+        self._template_parts = {
+            template_id: _PLACEHOLDER_RE.split(getattr(self, attr))
+            for template_id, attr in _TEMPLATE_ATTRS.items()
+        }
+        self._render_cached.cache_clear()
 
     def _format_message_template(self, template, wxid):
         """格式化消息模板，替换变量"""
-        now = datetime.now()
-        
-        # 准备替换变量
-        replacements = {
-            "{wxid}": wxid,
-            "{time}": now.strftime("%Y-%m-%d %H:%M:%S"),
-            "{date}": now.strftime("%Y-%m-%d"),
-            "{hour}": now.strftime("%H:%M"),
-            "{bot_name}": getattr(self, "bot_name", "微信机器人"),
-            "{bot_wxid}": self.current_wxid
-        }
-        
-        # 替换所有变量
-        result = template
-        for key, value in replacements.items():
-            result = result.replace(key, value)
-            
-        return result
+        if "{" not in template:
+            return template
+        return self._render_parts(_PLACEHOLDER_RE.split(template), wxid)
+
+    def _render_parts(self, parts, wxid):
+        """拼接拆分后的模板，parts的奇数位为变量名"""
+        # 没有变量的模板直接返回
+        if len(parts) == 1:
+            return parts[0]
+        
+        # 变量按需计算，模板未引用的变量不会求值
+        replacements = _LazyVars(self, wxid)
+        
+        # 常量片段原样保留，只替换变量位
+        result = list(parts)
+        for i in range(1, len(result), 2):
+            result[i] = replacements[result[i]]
+        return "".join(result)
+
+    def _render_template(self, template_id, wxid, minute_bucket):
+        """按模板ID渲染预拆分的模板，minute_bucket仅用作缓存键"""
+        return self._render_parts(self._template_parts[template_id], wxid)
+
+    def _render(self, template_id, wxid):
+        """渲染模板，同一分钟内的结果会被缓存"""
+        return self._render_cached(template_id, wxid, int(time.time() // 60))
 
     async def async_init(self):
         """获取当前机器人ID并启动监控"""
         logger.info("SMSNotifier插件开始初始化")
+        self._closed = False
         
         # 创建心跳错误文件
-        error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-        with open(error_path, "w") as f:
-            f.write(f"初始化心跳错误日志: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        logger.info(f"创建心跳错误文件: {error_path}")
+        await asyncio.to_thread(self._write_lines, [f"初始化心跳错误日志: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"], "w")
+        self.last_log_position = 0
+        logger.info(f"创建心跳错误文件: {self._err_path}")
+        
+        # 启动心跳错误文件写入任务
+        if self._err_writer_task is None or self._err_writer_task.done():
+            self._err_writer_task = asyncio.create_task(self._err_writer())
+        
+        # 创建共享HTTP会话，复用连接池
+        await self._ensure_session()
         
         # 创建异步任务
         tasks = []
@@ -280,6 +504,7 @@ class SMSNotifier(PluginBase):
                             
                             # 添加到监控列表
                             self.users[self.current_wxid] = ""  # 接收者留空表示发送给token拥有者
+                            self._refresh_sole_user()
                             logger.info(f"已将当前微信ID {self.current_wxid} 添加到监控列表")
                             return True
                         else:
@@ -295,15 +520,19 @@ class SMSNotifier(PluginBase):
                         if not self.current_wxid and message.get("SenderWxid", "").startswith("wxid_"):
                             logger.info(f"从消息中识别到可能的当前wxid: {message.get('SenderWxid')}")
                             self.current_wxid = message.get("SenderWxid")
+                            self._wxid_event.set()
                             self.users[self.current_wxid] = ""
+                            self._refresh_sole_user()
                             logger.info(f"已通过消息回调将 {self.current_wxid} 添加到监控列表")
                             return True
                         return False
                     
                     # 最多等待30秒来获取wxid
-                    start_time = time.time()
-                    while not self.current_wxid and time.time() - start_time < 30:
-                        await asyncio.sleep(1)
+                    if not self.current_wxid:
+                        try:
+                            await asyncio.wait_for(self._wxid_event.wait(), timeout=30)
+                        except asyncio.TimeoutError:
+                            pass
                     
                     if self.current_wxid:
                         logger.info(f"通过消息回调成功获取到当前wxid: {self.current_wxid}")
@@ -316,6 +545,7 @@ class SMSNotifier(PluginBase):
                 if self.current_wxid:
                     logger.info(f"使用配置文件中的wxid: {self.current_wxid}")
                     self.users[self.current_wxid] = ""  # 确保在用户列表中
+                    self._refresh_sole_user()
                     return True
                 else:
                     # 如果仍然无法获取wxid，记录警告
@@ -335,50 +565,158 @@ class SMSNotifier(PluginBase):
             api_task = asyncio.create_task(self._check_api_heartbeat())
             tasks.append(api_task)
         
+        self._bg_tasks = tasks
         return tasks
 
-    @on_text_message(priority=1)
-    async def capture_bot_id(self, bot: WechatAPIClient, message: dict):
-        """捕获机器人ID"""
-        # 保存bot引用
-        self.bot = bot
-        
-        # 如果尚未获取到微信ID，尝试从消息中获取
-        if not self.current_wxid:
-            # 如果消息中包含自己的信息，尝试获取
-            if message.get("SenderWxid", "").startswith("wxid_"):
-                self.current_wxid = message.get("SenderWxid")
-                # 添加到监控列表
-                self.users[self.current_wxid] = ""  # 接收者留空表示发送给token拥有者
-                logger.info(f"从消息中捕获到当前微信ID: {self.current_wxid}")
+    def _queue_error_line(self, line: str):
+        """将一行记录放入心跳错误文件写入队列，不阻塞事件循环"""
+        if self._closed:
+            return
+        try:
+            self._err_queue.put_nowait(line)
+        except asyncio.QueueFull:
+            logger.warning("心跳错误文件写入队列已满，丢弃记录")
+
+    async def _err_writer(self):
+        """从队列中批量取出记录并在线程中追加到心跳错误文件"""
+        while True:
+            batch = [await self._err_queue.get()]
+            while len(batch) < 64:
+                try:
+                    batch.append(self._err_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await asyncio.to_thread(self._write_lines, batch)
+            except Exception as e:
+                logger.error(f"写入心跳错误文件失败: {e}")
+
+    def _write_lines(self, lines: List[str], mode: str = "a"):
+        """追加多行到心跳错误文件，mode为"w"时先清空文件（阻塞）"""
+        with open(self._err_path, mode, encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，未创建或已关闭时重新创建"""
+        if self._closed:
+            raise RuntimeError("SMSNotifier插件已禁用")
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, keepalive_timeout=75, ttl_dns_cache=300)
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=10),
+                # json=参数统一走orjson序列化
+                json_serialize=lambda obj: orjson.dumps(obj).decode(),
+            )
+        return self._http
+
+    async def _ensure_redis(self):
+        """获取通知去重用的Redis客户端，未配置、未安装redis或插件已禁用时返回None"""
+        if self._closed:
+            return None
+        if self.redis_url != self._redis_url_active:
+            # 先同步换下旧客户端再等待关闭，并发调用不会重复关闭或重复创建
+            old_client = self._redis
+            self._redis = None
+            if self.redis_url and aioredis is None:
+                logger.warning("已配置redis_url但未安装redis，通知去重仅在进程内生效")
+            elif self.redis_url:
+                self._redis = aioredis.from_url(self.redis_url)
+            self._redis_url_active = self.redis_url
+            if old_client is not None:
+                await self._close_redis(old_client)
+        return self._redis
+
+    @staticmethod
+    async def _close_redis(client):
+        """关闭Redis客户端，redis-py 5.0.1之前没有aclose时退回close"""
+        try:
+            close = getattr(client, "aclose", None) or client.close
+            await close()
+        except Exception as e:
+            logger.error(f"关闭Redis连接失败: {e}")
+
+    async def _should_notify(self, wxid: str) -> bool:
+        """1小时内同一用户只通知一次，返回本次是否应发送通知"""
+        redis_client = await self._ensure_redis()
+        if redis_client is not None:
+            try:
+                return bool(await redis_client.set(f"sms:notified:{wxid}", "1", ex=3600, nx=True))
+            except Exception as e:
+                logger.error(f"Redis去重检查失败，改用进程内记录: {e}")
         
-        return True  # 继续处理消息
+        current_time = time.time()
+        if current_time - self._last_notification_time.get(wxid, 0) < 3600:
+            return False
+        self._last_notification_time[wxid] = current_time
+        return True
+
+    async def _clear_notified(self, wxid: str):
+        """通知发送失败时清除去重记录，允许下次重新发送"""
+        self._last_notification_time.pop(wxid, None)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(f"sms:notified:{wxid}")
+            except Exception as e:
+                logger.error(f"清除Redis去重记录失败: {e}")
+
+    async def on_disable(self):
+        """禁用插件时停止后台任务，关闭共享HTTP会话、Redis连接和心跳错误文件句柄"""
+        await super().on_disable()
+        self._closed = True
+        for task in self._bg_tasks:
+            task.cancel()
+        self._bg_tasks = []
+        if self.check_task:
+            self.check_task.cancel()
+            self.check_task = None
+        if self._err_writer_task is not None:
+            self._err_writer_task.cancel()
+            self._err_writer_task = None
+        if self._http and not self._http.closed:
+            await self._http.close()
+        self._http = None
+        if self._redis is not None:
+            await self._close_redis(self._redis)
+            self._redis = None
+            self._redis_url_active = ""
+        if self._err_fp is not None:
+            self._err_fp.close()
+            self._err_fp = None
 
     @on_text_message(priority=20)
-    async def handle_test_command(self, bot: WechatAPIClient, message: dict):
-        """处理测试发送通知命令"""
+    async def handle_command(self, bot: WechatAPIClient, message: dict):
+        """按命令首个词分发SMSNotifier命令，非命令消息直接返回，管理员检查只做一次"""
         # 保存bot引用
         self.bot = bot
         
         if not self.enable:
             return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_test"):
+        
+        # 只切出首个词查找命令，普通消息不做完整切分
+        content = message.get("Content", "")
+        head = content.split(None, 1)
+        handler = self._commands.get(head[0]) if head else None
+        if handler is None:
             return
-            
+        
         # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
+        if not await self.is_admin(bot, message.get("SenderWxid", "")):
             await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
             return
         
+        await handler(bot, message, content.split())
+
+    async def _do_test(self, bot: WechatAPIClient, message: dict, parts: List[str]):
+        """处理测试发送通知命令"""
         # 尝试获取wxid（如果尚未获取）
         if not self.current_wxid:
             # 尝试直接使用发送者的ID
-            self.current_wxid = sender
+            self.current_wxid = message.get("SenderWxid", "")
+            self._wxid_event.set()
             logger.info(f"使用测试命令发送者的ID作为微信ID: {self.current_wxid}")
             self.users[self.current_wxid] = ""
+            self._refresh_sole_user()
         
         # 使用当前设置的微信ID
         wxid = self.current_wxid
@@ -393,27 +731,8 @@ class SMSNotifier(PluginBase):
         else:
             await bot.send_text_message(message["FromWxid"], f"发送测试通知失败，wxid={wxid}")
             
-    @on_text_message(priority=20)
-    async def handle_set_wxid_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_set_wxid(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """手动设置当前微信ID"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_set_wxid "):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
-        parts = content.split()
-        
         if len(parts) < 2:
             await bot.send_text_message(message["FromWxid"], "用法: sms_set_wxid <wxid>")
             return
@@ -423,18 +742,18 @@ class SMSNotifier(PluginBase):
         # 设置当前微信ID
         old_wxid = self.current_wxid
         self.current_wxid = wxid
+        self._wxid_event.set()
         
         # 更新监控列表
         if old_wxid in self.users:
             del self.users[old_wxid]
         self.users[wxid] = ""  # 接收者留空表示发送给token拥有者
+        self._refresh_sole_user()
         
-        # 更新配置文件
+        # 更新配置文件，文件读写放到线程中执行
         try:
-            config_path = os.path.join(os.path.dirname(__file__), "config.toml")
-            if os.path.exists(config_path):
-                with open(config_path, "rb") as f:
-                    config_data = tomllib.load(f)
+            if os.path.exists(self._config_path):
+                config_data = await asyncio.to_thread(self._read_config_sync, self._config_path)
                 
                 # 更新current_wxid
                 if "basic" not in config_data:
@@ -442,54 +761,7 @@ class SMSNotifier(PluginBase):
                 config_data["basic"]["current_wxid"] = wxid
                 
                 # 写回配置文件
-                with open(config_path, "w", encoding="utf-8") as f:
-                    # 手动构建TOML格式，因为Python的tomllib只支持读取
-                    # 基础部分
-                    f.write("[basic]\n")
-                    for key, value in config_data["basic"].items():
-                        if isinstance(value, bool):
-                            f.write(f'{key} = {str(value).lower()}\n')
-                        elif isinstance(value, (int, float)):
-                            f.write(f'{key} = {value}\n')
-                        else:
-                            f.write(f'{key} = "{value}"\n')
-                    f.write("\n")
-                    
-                    # PushPlus部分
-                    if "pushplus" in config_data:
-                        f.write("[pushplus]\n")
-                        for key, value in config_data["pushplus"].items():
-                            if isinstance(value, bool):
-                                f.write(f'{key} = {str(value).lower()}\n')
-                            elif isinstance(value, (int, float)):
-                                f.write(f'{key} = {value}\n')
-                            else:
-                                f.write(f'{key} = "{value}"\n')
-                        f.write("\n")
-                    
-                    # 通知配置部分
-                    if "notification" in config_data:
-                        f.write("[notification]\n")
-                        for key, value in config_data["notification"].items():
-                            if isinstance(value, bool):
-                                f.write(f'{key} = {str(value).lower()}\n')
-                            elif isinstance(value, (int, float)):
-                                f.write(f'{key} = {value}\n')
-                            else:
-                                f.write(f'{key} = "{value}"\n')
-                        f.write("\n")
-                    
-                    # 消息模板部分
-                    if "message" in config_data:
-                        f.write("[message]\n")
-                        for key, value in config_data["message"].items():
-                            if isinstance(value, bool):
-                                f.write(f'{key} = {str(value).lower()}\n')
-                            elif isinstance(value, (int, float)):
-                                f.write(f'{key} = {value}\n')
-                            else:
-                                f.write(f'{key} = "{value}"\n')
-                        f.write("\n")
+                await asyncio.to_thread(self._write_config_sync, self._config_path, config_data)
         except Exception as e:
             logger.error(f"更新配置文件时出错: {e}")
         
@@ -504,76 +776,165 @@ class SMSNotifier(PluginBase):
             await bot.send_text_message(message["FromWxid"], "测试通知发送失败")
 
     async def _check_loop(self):
-        """定期检查用户在线状态的循环"""
+        """定期检查用户在线状态的循环，每个用户按各自的下次检查时间调度"""
+        next_log_scan = 0.0
         while self.enable:
+            self._sync_schedule()
+            
+            # 等待最早到期的用户或错误日志扫描
+            now = time.time()
+            next_user = self._schedule[0][0] if self._schedule else now + self._hb_period
+            next_check = min(next_user, next_log_scan)
+            if next_check > now:
+                await asyncio.sleep(next_check - now)
+                continue
+            
+            # 简化检查条件，不再尝试创建XYBot实例
+            if not (hasattr(self, 'bot') and self.bot):
+                logger.warning("无法获取机器人实例，跳过本次检查")
+                await asyncio.sleep(self._hb_period)
+                continue
+            
+            due = []
             try:
-                # 简化检查条件，不再尝试创建XYBot实例
-                if hasattr(self, 'bot') and self.bot:
-                    await self._check_users(self.bot)
-                else:
-                    logger.warning("无法获取机器人实例，跳过本次检查")
-                    
+                if now >= next_log_scan:
+                    next_log_scan = now + self._hb_period
+                    await self._scan_error_log(now)
+                
+                # 只取出已到期的用户，已移除的用户直接丢弃
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, wxid = heapq.heappop(self._schedule)
+                    self._scheduled.discard(wxid)
+                    if wxid in self.users:
+                        due.append(wxid)
+                
+                if due:
+                    await self._check_users(self.bot, due)
             except Exception as e:
                 logger.error(f"检查用户在线状态出错: {str(e)}")
             
-            # 等待下一次检查
-            await asyncio.sleep(self.check_interval)
+            # 按自适应间隔安排下一次检查
+            for wxid in due:
+                self._schedule_user(wxid, time.time() + self._interval_for(wxid))
     
-    async def _check_users(self, bot: WechatAPIClient):
-        """检查用户在线状态，并向离线用户发送短信通知"""
+    def _schedule_user(self, wxid: str, due: float):
+        """将用户加入调度堆"""
+        if wxid not in self._scheduled:
+            self._scheduled.add(wxid)
+            heapq.heappush(self._schedule, (due, wxid))
+    
+    def _sync_schedule(self):
+        """将新加入监控列表的用户加入调度堆，立即检查一次"""
+        # 按集合比较，移除一个用户再加入另一个用户时数量不变也能发现
+        if self._scheduled >= self.users.keys():
+            return
+        now = time.time()
+        for wxid in self.users:
+            self._schedule_user(wxid, now)
+    
+    def _interval_for(self, wxid: str) -> float:
+        """用户的下次检查间隔"""
+        return self._hb_period
+    
+    def _read_new_error_data(self) -> bytes:
+        """读取心跳错误文件中上次位置之后新增的完整行（阻塞）"""
+        # 检查心跳错误文件
         try:
-            # 不再尝试获取好友列表，直接通过心跳检测和错误日志来判断状态
-            current_time = time.time()
+            st = os.stat(self._err_path)
+        except FileNotFoundError:
+            return b""
+        
+        # 文件被替换时重新打开，被截断时从头开始读取
+        if self._err_fp is None or os.fstat(self._err_fp.fileno()).st_ino != st.st_ino:
+            if self._err_fp is not None:
+                self._err_fp.close()
+                self.last_log_position = 0
+            self._err_fp = open(self._err_path, "rb")
+        elif st.st_size < self.last_log_position:
+            self.last_log_position = 0
+        
+        # 只读取上次位置之后新增的完整行
+        self._err_fp.seek(self.last_log_position)
+        new_data = self._err_fp.read()
+        new_data = new_data[:new_data.rfind(b"\n") + 1]
+        self.last_log_position += len(new_data)
+        return new_data
+
+    async def _scan_error_log(self, current_time: float):
+        """扫描心跳错误文件中新增的失败记录"""
+        try:
+            new_data = await asyncio.to_thread(self._read_new_error_data)
             
-            # 检查心跳错误文件
-            error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-            if os.path.exists(error_path):
+            for error_line in new_data.decode("utf-8", errors="replace").splitlines():
+                # 插件自己记录的行已在捕获时处理过
+                if error_line.startswith(_OWN_LINE_PREFIXES):
+                    continue
+                
+                # 只处理带有wxid的心跳失败行
+                err_match = _ERR_LINE_RE.search(error_line)
+                if not err_match:
+                    continue
+                
+                # 提取时间戳
                 try:
-                    with open(error_path, "r", encoding='utf-8') as f:
-                        recent_errors = f.readlines()[-10:]  # 只读取最后10行
-                        for error_line in recent_errors:
-                            if "心跳失败" in error_line or "Heartbeat failed" in error_line or "用户可能退出" in error_line:
-                                # 提取时间戳
-                                try:
-                                    error_time_str = error_line.split()[0]
-                                    error_time = datetime.strptime(error_time_str, "%Y/%m/%d %H:%M:%S")
-                                    error_timestamp = error_time.timestamp()
-                                    
-                                    # 只处理最近5分钟内的错误
-                                    if current_time - error_timestamp <= 300:
-                                        # 提取wxid
-                                        wxid_match = re.search(r'wxid_\w+', error_line)
-                                        if wxid_match:
-                                            wxid = wxid_match.group(0)
-                                            if wxid in self.users:
-                                                logger.warning(f"从错误日志检测到用户 {wxid} 的心跳失败")
-                                                await self._process_heartbeat_failure(wxid)
-                                except Exception as e:
-                                    logger.error(f"处理错误日志时间戳出错: {e}")
+                    ts_match = _TS_RE.search(error_line)
+                    if not ts_match:
+                        continue
+                    error_timestamp = _parse_ts(ts_match.group(0))
+                    
+                    # 只处理最近5分钟内的错误
+                    if current_time - error_timestamp <= 300:
+                        wxid = err_match.group(1)
+                        if wxid in self.users:
+                            # 同一用户不早于已处理记录的行不再重复计数
+                            if error_timestamp <= self._seen_log_ts.get(wxid, 0):
+                                continue
+                            self._seen_log_ts[wxid] = error_timestamp
+                            
+                            # 与消息捕获共用去重窗口，并遵守1小时通知限制
+                            if not self._claim_recent_failure(wxid) or not await self._should_notify(wxid):
+                                continue
+                            logger.warning(f"从错误日志检测到用户 {wxid} 的心跳失败")
+                            if not await self._process_heartbeat_failure(wxid):
+                                await self._clear_notified(wxid)
                 except Exception as e:
-                    logger.error(f"读取心跳错误文件失败: {e}")
+                    logger.error(f"处理错误日志时间戳出错: {e}")
+        except Exception as e:
+            logger.error(f"读取心跳错误文件失败: {e}")
+
+    async def _check_users(self, bot: WechatAPIClient, wxids: List[str]):
+        """检查到期用户的在线状态，并向离线用户发送短信通知"""
+        try:
+            # 不再尝试获取好友列表，直接通过心跳检测和错误日志来判断状态
+            current_time = time.time()
             
-            # 检查每个配置的用户
-            for wxid in self.users.keys():
-                # 检查是否在离线列表中
+            # 持续离线的用户按提醒间隔再次通知，同一轮的用户合并为一次请求
+            pending = [wxid for wxid in wxids
+                       if wxid in self.offline_users and self._notification_due(wxid, current_time)]
+            if pending:
+                for wxid in await self._send_pushplus_batch(pending):
+                    self._mark_notified(wxid, current_time)
+                    logger.info(f"已向持续离线的用户 {wxid} 发送提醒")
+            
+            # 检查每个到期的用户
+            for wxid in wxids:
+                # 离线用户已在上面处理
                 if wxid in self.offline_users:
-                    # 已知离线的用户，检查是否需要再次通知
-                    last_sent = self.notification_sent.get(wxid, 0)
-                    if current_time - last_sent > 3600:  # 至少间隔1小时
-                        success = await self._send_sms_notification(wxid)
-                        if success:
-                            self.notification_sent[wxid] = current_time
-                            logger.info(f"已向持续离线的用户 {wxid} 发送提醒")
                     continue
                 
                 # 尝试发送心跳包
                 try:
+                    start = time.monotonic()
                     heartbeat_result = await bot.heartbeat()
                     if not heartbeat_result:
                         logger.warning(f"用户 {wxid} 心跳检测失败")
+                        self._shrink_heartbeat_period()
                         await self._process_heartbeat_failure(wxid)
+                    else:
+                        self._record_heartbeat_rtt(time.monotonic() - start)
                 except Exception as e:
                     logger.error(f"发送心跳包时出错: {e}")
+                    self._shrink_heartbeat_period()
                     await self._process_heartbeat_failure(wxid)
         
         except Exception as e:
@@ -581,59 +942,117 @@ class SMSNotifier(PluginBase):
             # 发生错误时，通过心跳失败检测来处理
             logger.info("将依赖心跳失败日志检测来进行通知")
     
-    async def _send_sms_notification(self, wxid: str, to: str = "") -> bool:
-        """发送通知（通过PushPlus）"""
-        # 重命名为更清晰的名称
-        return await self._send_pushplus_notification(wxid, to)
-        
+    def _notification_due(self, wxid: str, now: float) -> bool:
+        """持续离线的用户在提醒间隔内不重复通知"""
+        return now - self.notification_sent.get(wxid, 0) >= _OFFLINE_REMIND_INTERVAL
+
+    def _mark_notified(self, wxid: str, now: float):
+        """记录已发送通知的时间"""
+        self.notification_sent[wxid] = now
+
+    def _record_heartbeat_rtt(self, rtt: float):
+        """记录成功心跳的耗时，链路稳定时逐步延长检查间隔"""
+        self._rtt_buf.append(rtt)
+        if len(self._rtt_buf) >= _HB_MIN_SAMPLES and statistics.pvariance(self._rtt_buf) < _HB_RTT_VAR_MAX:
+            # 稳定时最多延长到配置间隔的4倍
+            self._hb_period = min(self.check_interval * 4, self._hb_period * 1.5)
+        else:
+            # 不稳定时回到配置间隔，失败后缩短的间隔也逐步恢复
+            self._hb_period = min(self.check_interval, self._hb_period * 1.5)
+
+    def _shrink_heartbeat_period(self):
+        """心跳失败时缩短检查间隔，加快离线检测"""
+        self._hb_period = max(1, self._hb_period / 2)
+
     async def _send_pushplus_notification(self, wxid: str, to: str = "") -> bool:
         """发送通知（通过PushPlus）"""
         if not self.pushplus_token:
             logger.error(f"发送通知所需参数不完整: pushplus_token={bool(self.pushplus_token)}")
             return False
         
-        # 请求地址
-        url = 'http://www.pushplus.plus/send'
-        
         # 消息标题和内容
-        title = self._format_message_template(self.title_template, wxid)
-        content = self._format_message_template(self.content_template, wxid)
+        title = self._render('title', wxid)
+        content = self._render('content', wxid)
+        
+        logger.info(f"准备发送通知，渠道: {self.pushplus_channel}，发送给token拥有者")
+        
+        result = await self._post_pushplus(self._build_pushplus_data(title, content))
+        return bool(result) and result.get('code') == 200
+
+    async def _send_pushplus_batch(self, wxids: List[str]) -> List[str]:
+        """将多个离线用户合并为一条PushPlus通知发送，返回已成功通知的wxid列表"""
+        if not self.pushplus_token:
+            logger.error(f"发送通知所需参数不完整: pushplus_token={bool(self.pushplus_token)}")
+            return []
         
-        # 请求数据 - 直接发送给token拥有者
-        data = {
+        # 标题列出所有用户，内容依次拼接每个用户的通知
+        title = self._render('title', "、".join(wxids))
+        content = "".join(self._render('content', wxid) for wxid in wxids)
+        
+        logger.info(f"准备合并发送 {len(wxids)} 个用户的通知，渠道: {self.pushplus_channel}")
+        
+        # 失败时不再逐个重发，_post_pushplus已按配置重试，下一轮检查会再次尝试
+        result = await self._post_pushplus(self._build_pushplus_data(title, content))
+        if result and result.get('code') == 200:
+            return list(wxids)
+        return []
+
+    def _rebuild_pushplus_base(self):
+        """PushPlus配置变更后调用，预先构建请求数据中不变的部分"""
+        base = {
             "token": self.pushplus_token,
-            "title": title,
-            "content": content,
             "template": self.pushplus_template,
             "channel": self.pushplus_channel
         }
         
         # 可选的topic参数
         if self.pushplus_topic:
-            data["topic"] = self.pushplus_topic
-            
-        logger.info(f"准备发送通知，渠道: {self.pushplus_channel}，发送给token拥有者")
+            base["topic"] = self.pushplus_topic
+        
+        self._pushplus_base = base
+
+    def _build_pushplus_data(self, title: str, content: str) -> dict:
+        """构建PushPlus请求数据 - 直接发送给token拥有者"""
+        data = dict(self._pushplus_base)
+        data["title"] = title
+        data["content"] = content
+        return data
+
+    @staticmethod
+    def _is_token_error(result: dict) -> bool:
+        """判断PushPlus响应是否为token验证失败"""
+        error_msg = result.get('msg', '') or ''
+        return "token" in error_msg.lower() and "用户" in error_msg
+
+    async def _post_pushplus(self, data: dict) -> Optional[dict]:
+        """发送PushPlus请求并按配置重试，返回最后一次的API响应，请求未得到响应时返回None"""
+        # 请求地址
+        url = 'http://www.pushplus.plus/send'
         
+        # 请求体只序列化一次，重试时复用
+        body = orjson.dumps(data)
+        headers = {"Content-Type": "application/json"}
+        
+        result = None
         for retry in range(self.retry_times):
             try:
                 logger.info(f"尝试发送通知 (第 {retry+1}/{self.retry_times} 次)")
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=data) as response:
-                        result = await response.json()
-                        logger.info(f"PushPlus API响应: {result}")
-                        
-                        if result.get('code') == 200:
-                            logger.info(f"通知发送成功: {result}")
-                            return True
-                        else:
-                            error_msg = result.get('msg', '')
-                            if "token" in error_msg.lower() and "用户" in error_msg:
-                                logger.error(f"PushPlus token验证失败: {error_msg}")
-                                logger.warning("请确保：\n1. 使用了正确的token\n2. 使用token对应的微信账号登录了PushPlus网站")
-                                # 对于token错误，直接返回，不需要重试
-                                return False
-                            else:
-                                logger.error(f"通知发送失败: {result}")
+                session = await self._ensure_session()
+                async with self._pushplus_sem:
+                    async with session.post(url, data=body, headers=headers) as response:
+                        result = orjson.loads(await response.read())
+                logger.info(f"PushPlus API响应: {result}")
+                
+                if result.get('code') == 200:
+                    logger.info(f"通知发送成功: {result}")
+                    return result
+                elif self._is_token_error(result):
+                    logger.error(f"PushPlus token验证失败: {result.get('msg', '')}")
+                    logger.warning("请确保：\n1. 使用了正确的token\n2. 使用token对应的微信账号登录了PushPlus网站")
+                    # 对于token错误，直接返回，不需要重试
+                    return result
+                else:
+                    logger.error(f"通知发送失败: {result}")
             except Exception as e:
                 logger.error(f"发送通知出错: {str(e)}")
             
@@ -642,29 +1061,20 @@ class SMSNotifier(PluginBase):
                 logger.info(f"将在 {self.retry_interval} 秒后重试")
                 await asyncio.sleep(self.retry_interval)
         
-        return False
+        return result
 
-    @on_text_message(priority=20)
-    async def handle_reload_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_reload(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理重新加载配置命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if content != "sms_reload":
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
+        # 在线程中读取配置文件，读取失败时保留当前配置
+        try:
+            config = await asyncio.to_thread(self._read_config_sync, self._config_path)
+        except Exception as e:
+            logger.error(f"读取SMSNotifier配置文件失败: {str(e)}")
+            await bot.send_text_message(message["FromWxid"], f"重新加载配置失败: {str(e)}")
             return
         
         was_enabled = self.enable
-        self._load_config()
+        self._load_config(config)
         
         if was_enabled and not self.enable:
             if self.check_task:
@@ -675,74 +1085,41 @@ class SMSNotifier(PluginBase):
         
         await bot.send_text_message(message["FromWxid"], f"SMSNotifier配置已重新加载，插件现在{'已启用' if self.enable else '已禁用'}")
 
-    @on_text_message(priority=20)
-    async def handle_status_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_status(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理查询状态命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if content != "sms_status":
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
-        status_text = "SMSNotifier状态报告：\n"
-        status_text += f"启用状态: {'已启用' if self.enable else '已禁用'}\n"
-        status_text += f"通知渠道: {self.pushplus_channel}\n"
-        status_text += f"监控用户数: {len(self.users)}\n"
-        status_text += f"离线用户数: {len(self.offline_users)}\n"
-        status_text += f"已发送通知用户数: {len(self.notification_sent)}\n"
-        status_text += "\n离线用户列表:\n"
+        lines = [
+            "SMSNotifier状态报告：\n",
+            f"启用状态: {'已启用' if self.enable else '已禁用'}\n",
+            f"通知渠道: {self.pushplus_channel}\n",
+            f"监控用户数: {len(self.users)}\n",
+            f"离线用户数: {len(self.offline_users)}\n",
+            f"已发送通知用户数: {len(self.notification_sent)}\n",
+            "\n离线用户列表:\n",
+        ]
         
         if not self.offline_users:
-            status_text += "无离线用户\n"
+            lines.append("无离线用户\n")
         else:
-            for wxid in self.offline_users:
-                status_text += f"- {wxid}"
+            for wxid in tuple(self.offline_users):
+                lines.append(f"- {wxid}")
                 if wxid in self.notification_sent:
                     timestamp = self.notification_sent[wxid]
                     notify_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-                    status_text += f" (已通知于 {notify_time})"
-                status_text += "\n"
+                    lines.append(f" (已通知于 {notify_time})")
+                lines.append("\n")
         
-        await bot.send_text_message(message["FromWxid"], status_text)
+        await bot.send_text_message(message["FromWxid"], "".join(lines))
 
-    @on_text_message(priority=20)
-    async def handle_test_heartbeat_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_heartbeat(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理测试心跳状态命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_heartbeat"):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-            
-        parts = content.split()
         wxid = None
         
         if len(parts) > 1:
             wxid = parts[1]
         elif self.current_wxid:
             wxid = self.current_wxid
-        elif len(self.users) == 1:
-            wxid = list(self.users.keys())[0]
+        elif self._sole_user_wxid:
+            wxid = self._sole_user_wxid
             
         if not wxid:
             await bot.send_text_message(message["FromWxid"], "请指定要测试的wxid，例如: sms_heartbeat wxid_123456")
@@ -756,13 +1133,13 @@ class SMSNotifier(PluginBase):
         
         try:
             # 检查服务运行状态
-            async with aiohttp.ClientSession() as session:
-                async with session.get(is_running_url) as response:
-                    if response.status == 200:
-                        is_running_result = await response.text()
-                        logger.info(f"API运行状态检查结果: {is_running_result}")
-                    else:
-                        logger.warning(f"API服务状态检查失败，状态码: {response.status}")
+            session = await self._ensure_session()
+            async with session.get(is_running_url) as response:
+                if response.status == 200:
+                    is_running_result = await response.text()
+                    logger.info(f"API运行状态检查结果: {is_running_result}")
+                else:
+                    logger.warning(f"API服务状态检查失败，状态码: {response.status}")
         except Exception as e:
             logger.error(f"API状态检查出错: {e}")
             
@@ -802,67 +1179,39 @@ class SMSNotifier(PluginBase):
         to = self.users.get(wxid, "")
         
         # 构建测试消息内容
-        title = self._format_message_template(self.test_title_template, wxid)
-        content = self._format_message_template(self.test_content_template, wxid)
+        title = self._render('test_title', wxid)
+        content = self._render('test_content', wxid)
         
         # 请求地址
         url = 'http://www.pushplus.plus/send'
         
         # 请求数据
-        data = {
-            "token": self.pushplus_token,
-            "title": title,
-            "content": content,
-            "template": self.pushplus_template,
-            "channel": self.pushplus_channel
-        }
+        data = self._build_pushplus_data(title, content)
         
         # 如果有指定接收者并且channel是wechat，添加to参数
-        if to and self.pushplus_channel == "wechat":
+        if to and data["channel"] == "wechat":
             data["to"] = to
             
-        # 可选的topic参数
-        if self.pushplus_topic:
-            data["topic"] = self.pushplus_topic
-            
         logger.info(f"准备发送测试通知，渠道: {self.pushplus_channel}" + (f", 接收者: {to}" if to else ""))
         
         try:
-            async with aiohttp.ClientSession() as session:
+            session = await self._ensure_session()
+            async with self._pushplus_sem:
                 async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"PushPlus API响应: {result}")
-                    if result.get('code') == 200:
-                        logger.info(f"测试通知发送成功: {result}")
-                        return True
-                    else:
-                        logger.error(f"测试通知发送失败: {result}")
-                        return False
+                    result = orjson.loads(await response.read())
+            logger.info(f"PushPlus API响应: {result}")
+            if result.get('code') == 200:
+                logger.info(f"测试通知发送成功: {result}")
+                return True
+            else:
+                logger.error(f"测试通知发送失败: {result}")
+                return False
         except Exception as e:
             logger.error(f"发送测试通知出错: {str(e)}")
             return False
 
-    @on_text_message(priority=20)
-    async def handle_monitor_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_monitor(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理添加监控用户命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_monitor "):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
-        parts = content.split()
-        
         if len(parts) < 2:
             await bot.send_text_message(message["FromWxid"], "用法: sms_monitor <wxid> <to>")
             return
@@ -875,29 +1224,11 @@ class SMSNotifier(PluginBase):
             return
         
         self.users[wxid] = to
+        self._refresh_sole_user()
         await bot.send_text_message(message["FromWxid"], f"已成功将用户 {wxid} 添加到监控列表，使用接收者 {to}，渠道: {self.pushplus_channel}")
         
-    @on_text_message(priority=20)
-    async def handle_channel_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_channel(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理更改通知渠道命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_channel "):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
-        parts = content.split()
-        
         if len(parts) < 2:
             await bot.send_text_message(message["FromWxid"], "用法: sms_channel <channel>\n支持的渠道: wechat, sms, mail, webhook, cp")
             return
@@ -911,161 +1242,137 @@ class SMSNotifier(PluginBase):
             return
         
         self.pushplus_channel = channel
+        self._rebuild_pushplus_base()
         await bot.send_text_message(message["FromWxid"], f"已成功将通知渠道从 {old_channel} 更改为 {channel}")
 
+    def _classify(self, message) -> Optional[Tuple[str, Optional[str]]]:
+        """单次扫描消息内容，返回(故障原因, wxid)，无故障时返回None"""
+        content = message.get("Content", "") if isinstance(message, dict) else ""
+        if not isinstance(content, str) or not content:
+            return None
+        content_lower = content.lower()
+        wxid_match = _WXID_RE.search(content)
+        content_wxid = wxid_match.group(0) if wxid_match else None
+        sole_user = self._sole_user_wxid
+        
+        # 心跳关键字未能定位到监控用户时，继续检查离线和获取消息失败关键字
+        fallback = None
+        if any(k in content_lower for k in _HB_KEYWORDS):
+            msg_type = message.get("MsgType")
+            if msg_type == 1 and message.get("FromWxid") in ("admin", "system", "log"):
+                # 这可能是系统转发的错误日志
+                to_wxid = message.get("ToWxid") or ""
+                if not content_wxid and "wxid_" in to_wxid:
+                    content_wxid = to_wxid
+                fallback = ("日志消息心跳失败", content_wxid or self.current_wxid or None)
+            elif msg_type == 10000:
+                # 系统消息，未提取到wxid时使用当前配置的wxid或唯一用户
+                fallback = ("系统消息心跳失败", content_wxid or self.current_wxid or sole_user)
+            elif content_wxid and (content_wxid in self.users or content_wxid == self.current_wxid):
+                # 普通消息只处理监控列表中的用户
+                fallback = ("错误消息", content_wxid)
+            else:
+                fallback = ("错误消息", None)
+            if fallback[1]:
+                return fallback
+        
+        if any(k in content for k in _OFFLINE_KEYWORDS):
+            return "系统消息提示离线", content_wxid or self.current_wxid or None
+        
+        if "获取新消息失败" in content or "error" in content_lower:
+            # 如果我们监控的是当前登录账号，则直接处理此失败
+            if self.current_wxid and self.current_wxid in self.users:
+                return "检测到消息失败", self.current_wxid
+            return "检测到消息失败", sole_user
+        
+        return fallback
+
     @on_text_message(priority=1)  # 使用最高优先级确保捕获所有消息
     async def capture_error_messages(self, bot: WechatAPIClient, message: dict):
-        """直接捕获错误信息，不依赖日志文件"""
+        """捕获机器人ID，并直接捕获错误信息，不依赖日志文件"""
         # 保存bot引用
         self.bot = bot
         
+        # 如果尚未获取到微信ID，尝试从消息中获取
+        if not self.current_wxid:
+            # 如果消息中包含自己的信息，尝试获取
+            if message.get("SenderWxid", "").startswith("wxid_"):
+                self.current_wxid = message.get("SenderWxid")
+                self._wxid_event.set()
+                # 添加到监控列表
+                self.users[self.current_wxid] = ""  # 接收者留空表示发送给token拥有者
+                self._refresh_sole_user()
+                logger.info(f"从消息中捕获到当前微信ID: {self.current_wxid}")
+        
         if not self.enable:
             return True
-            
-        # 如果系统消息含有错误信息，则处理
-        try:
-            if message and isinstance(message, dict):
-                # 检查是否是日志转发的消息
-                if message.get("MsgType") == 1 and message.get("FromWxid") in ["admin", "system", "log"]:
-                    content = message.get("Content", "")
-                    if "心跳失败" in content or "Heartbeat failed" in content or "用户可能退出" in content:
-                        # 这可能是系统转发的错误日志
-                        logger.warning(f"从转发日志消息捕获心跳失败: {content}")
-                        
-                        # 尝试提取wxid
-                        wxid_match = re.search(r'wxid_\w+', content)
-                        wxid = None
-                        if wxid_match:
-                            wxid = wxid_match.group(0)
-                            logger.info(f"从日志消息提取到wxid: {wxid}")
-                        elif message.get("ToWxid") and "wxid_" in message.get("ToWxid"):
-                            wxid = message.get("ToWxid")
-                            logger.info(f"使用ToWxid作为目标: {wxid}")
-                        elif hasattr(self, 'current_wxid') and self.current_wxid:
-                            wxid = self.current_wxid
-                            
-                        if wxid:
-                            await self._process_heartbeat_failure(wxid)
-                        
-                        # 写入到心跳错误文件
-                        try:
-                            error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-                            with open(error_path, "a") as f:
-                                f.write(f"日志消息心跳失败: {time.strftime('%Y-%m-%d %H:%M:%S')} - wxid:{wxid or '未知'} - {content}\n")
-                        except Exception as e:
-                            logger.error(f"写入心跳错误文件失败: {e}")
-                
-                # 处理系统消息
-                if message.get("MsgType") == 10000:  # 系统消息
-                    content = message.get("Content", "")
-                    if "用户可能退出" in content or "心跳失败" in content:
-                        logger.warning(f"直接从系统消息捕获心跳失败: {content}")
-                        
-                        # 尝试提取wxid
-                        wxid_match = re.search(r'wxid_\w+', content)
-                        if wxid_match:
-                            wxid = wxid_match.group(0)
-                            logger.info(f"从系统消息提取到wxid: {wxid}")
-                            await self._process_heartbeat_failure(wxid)
-                        elif hasattr(self, 'current_wxid') and self.current_wxid:
-                            # 使用配置的wxid
-                            logger.info(f"使用当前配置的wxid: {self.current_wxid}")
-                            await self._process_heartbeat_failure(self.current_wxid)
-                        elif len(self.users) == 1:
-                            # 如果只有一个用户，使用该用户
-                            wxid = list(self.users.keys())[0]
-                            logger.info(f"仅有一个配置的用户，使用该用户: {wxid}")
-                            await self._process_heartbeat_failure(wxid)
-        except Exception as e:
-            logger.error(f"处理可能的错误消息时发生异常: {e}")
         
-        # 将错误信息保存到特殊文件，以便直接监控检测到
         try:
-            # 检查是否包含错误信息
-            msg_str = str(message)
-            if "心跳失败" in msg_str or "heartbeat failed" in msg_str.lower() or "用户可能退出" in msg_str:
-                error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-                with open(error_path, "a") as f:
-                    f.write(f"错误消息: {time.strftime('%Y-%m-%d %H:%M:%S')} - {msg_str[:200]}...\n")
-                logger.info(f"记录心跳失败信息到错误文件")
-                
-                # 从整个消息字符串中提取wxid
-                wxid_match = re.search(r'wxid_\w+', msg_str)
-                if wxid_match:
-                    wxid = wxid_match.group(0)
-                    logger.info(f"从消息字符串提取到wxid: {wxid}")
-                    # 检查是否与监控用户匹配
-                    if wxid in self.users or wxid == self.current_wxid:
-                        logger.warning(f"检测到监控用户 {wxid} 的心跳失败")
-                        await self._process_heartbeat_failure(wxid)
-                    else:
-                        logger.info(f"提取的wxid {wxid} 不在监控列表中")
-        except Exception as e:
-            logger.error(f"写入错误信息到文件时出错: {e}")
-        
-        # 监听所有消息是否有退出或离线提示    
-        try:
-            # 监听系统消息和错误报告
-            content = str(message)
-            if isinstance(message, dict):
-                content_field = message.get("Content", "")
-                if isinstance(content_field, str) and (
-                    "已退出" in content_field or 
-                    "离线" in content_field or 
-                    "不在线" in content_field or
-                    "登录异常" in content_field
-                ):
-                    # 记录到错误文件
-                    error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-                    with open(error_path, "a") as f:
-                        f.write(f"系统消息提示离线: {time.strftime('%Y-%m-%d %H:%M:%S')} - {content_field}\n")
-                    
-                    # 尝试提取wxid
-                    wxid = None
-                    wxid_match = re.search(r'wxid_\w+', content_field)
-                    if wxid_match:
-                        wxid = wxid_match.group(0)
-                    elif self.current_wxid:
-                        wxid = self.current_wxid
-                        
-                    if wxid:
-                        logger.warning(f"从系统消息中检测到用户离线: {wxid}")
-                        await self._process_heartbeat_failure(wxid)
+            result = self._classify(message)
+            if result is None:
+                return True
             
-            # 检查是否包含"获取新消息失败"字眼
-            if "获取新消息失败" in content or "error" in content.lower():
-                error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
-                with open(error_path, "a") as f:
-                    f.write(f"检测到消息失败: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                logger.info("检测到获取消息失败")
-                
-                # 如果我们监控的是当前登录账号，则直接处理此失败
-                if self.current_wxid and self.current_wxid in self.users:
-                    logger.warning(f"检测到当前账号 {self.current_wxid} 可能离线，处理心跳失败")
-                    await self._process_heartbeat_failure(self.current_wxid)
-                elif len(self.users) == 1:
-                    # 如果只有一个用户，默认处理
-                    wxid = list(self.users.keys())[0]
-                    logger.warning(f"检测到心跳失败，默认处理唯一监控用户: {wxid}")
-                    await self._process_heartbeat_failure(wxid)
+            reason, wxid = result
+            content = message.get("Content", "")
+            # 将错误信息保存到特殊文件，以便直接监控检测到
+            self._queue_error_line(f"{reason}: {time.strftime('%Y-%m-%d %H:%M:%S')} - wxid:{wxid or '未知'} - {content[:200]}\n")
+            if not wxid:
+                return True
+            
+            # 同一用户在去重窗口内的重复故障只处理一次
+            if not self._claim_recent_failure(wxid):
+                return True
+            
+            logger.warning(f"{reason}，处理用户 {wxid} 的心跳失败")
+            await self._process_heartbeat_failure(wxid)
         except Exception as e:
             logger.error(f"分析消息出错: {e}")
             
         return True  # 继续处理其他插件
 
-    async def _process_heartbeat_failure(self, wxid):
-        """处理心跳失败记录"""
+    def _claim_recent_failure(self, wxid: str) -> bool:
+        """去重窗口内同一用户的故障只处理一次，返回本次是否应处理"""
+        now = time.time()
+        if now - self._recent_failures.get(wxid, 0) <= self.dedupe_window:
+            return False
+        self._recent_failures[wxid] = now
+        return True
+
+    async def _notify_users_concurrently(self, reason: str):
+        """并发通知所有满足1小时去重条件的监控用户，并发度由PushPlus信号量限制"""
+        wxids = tuple(self.users)
+        allowed = await asyncio.gather(*(self._should_notify(wxid) for wxid in wxids))
+        to_notify = [wxid for wxid, ok in zip(wxids, allowed) if ok]
+        if not to_notify:
+            return
+        
+        logger.warning(f"{reason}，发送通知给用户: {'、'.join(to_notify)}")
+        results = await asyncio.gather(
+            *(self._process_heartbeat_failure(wxid) for wxid in to_notify),
+            return_exceptions=True,
+        )
+        for wxid, result in zip(to_notify, results):
+            if isinstance(result, Exception):
+                logger.error(f"通知用户 {wxid} 出错: {result}")
+            if result is not True:
+                # 发送失败时清除去重记录，允许下次重新发送
+                await self._clear_notified(wxid)
+
+    async def _process_heartbeat_failure(self, wxid) -> bool:
+        """处理心跳失败记录，返回是否已发送通知"""
         logger.info(f"处理心跳失败: wxid={wxid}")
         
-        if wxid in self.users:
-            # 发送通知
-            success = await self._send_pushplus_notification(wxid)
-            if success:
-                logger.info(f"已向心跳检测失败的用户 {wxid} 发送离线通知")
-            else:
-                logger.error(f"向心跳检测失败的用户 {wxid} 发送通知失败")
-        else:
+        if wxid not in self.users:
             logger.warning(f"忽略非监控用户 {wxid} 的心跳失败")
+            return False
+        
+        # 发送通知
+        success = await self._send_pushplus_notification(wxid)
+        if success:
+            logger.info(f"已向心跳检测失败的用户 {wxid} 发送离线通知")
+        else:
+            logger.error(f"向心跳检测失败的用户 {wxid} 发送通知失败")
+        return success
 
     async def _send_heartbeat_notification(self, wxid: str, to: str):
         """发送心跳失败通知"""
@@ -1089,18 +1396,33 @@ class SMSNotifier(PluginBase):
             logger.error(f"向心跳检测失败的用户 {wxid} 发送通知失败")
             return False
 
+    @staticmethod
+    def _load_admins_sync(config_path):
+        """读取主配置中的admin列表（在线程中执行）"""
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)
+        return frozenset(config.get("XYBot", {}).get("admins", []))
+
     async def is_admin(self, bot: WechatAPIClient, wxid: str) -> bool:
         """检查用户是否为管理员"""
+        cache = self._admin_cache
+        now = time.time()
+        if now < cache["expires"]:
+            return wxid in cache["admins"]
+        
         try:
-            # 获取主配置中的admin列表
+            # 获取主配置中的admin列表，文件未修改时只刷新过期时间
             config_path = "main_config.toml"
-            if os.path.exists(config_path):
-                with open(config_path, "rb") as f:
-                    config = tomllib.load(f)
-                admins = config.get("XYBot", {}).get("admins", [])
-                return wxid in admins
+            st = os.stat(config_path)
+            if st.st_mtime != cache["mtime"]:
+                cache["admins"] = await asyncio.to_thread(self._load_admins_sync, config_path)
+                cache["mtime"] = st.st_mtime
+            cache["expires"] = now + 30
+        except FileNotFoundError:
+            cache.update(mtime=0, admins=frozenset(), expires=now + 30)
         except Exception as e:
             logger.error(f"检查管理员权限失败: {e}")
+        return wxid in cache["admins"]
 
     async def _check_api_heartbeat(self):
         """检查API状态并直接监听日志"""
@@ -1109,11 +1431,8 @@ class SMSNotifier(PluginBase):
         # API服务器地址
         api_base_url = "http://127.0.0.1:9000"
         
-        # 记录上次通知时间
-        last_notification_time = {}
-        
         # 心跳失败计数
-        failure_count = {}
+        failure_count = _LRU()
         
         # 使用自定义日志处理器捕获相关日志
         class HeartbeatLogHandler:
@@ -1127,14 +1446,11 @@ class SMSNotifier(PluginBase):
             def __call__(self, message):
                 # 直接使用传入的消息字符串 - message已经是字符串而不是字典
                 try:
-                    # 检查是否包含心跳失败信息
-                    if "Heartbeat failed for wxid" in message:
-                        # 提取wxid
-                        wxid_match = re.search(r'Heartbeat failed for wxid (wxid_\w+)', message)
-                        if wxid_match:
-                            wxid = wxid_match.group(1)
-                            # 回调处理心跳失败
-                            asyncio.create_task(self.callback(wxid))
+                    # 检查是否包含心跳失败信息，并提取wxid
+                    wxid_match = _HB_RE.search(message)
+                    if wxid_match:
+                        # 回调处理心跳失败
+                        asyncio.create_task(self.callback(wxid_match.group(1)))
                     
                     # 检查是否包含消息获取失败信息
                     elif "获取新消息失败" in message and "用户可能退出" in message:
@@ -1148,14 +1464,22 @@ class SMSNotifier(PluginBase):
                 return True
             
             def register(self):
-                # 注册日志处理器
-                self.handler_id = logger.add(self, level="INFO")
+                # 注册日志处理器，已注册时不重复添加
+                if self.handler_id is not None:
+                    return
+                # 由filter先按原始消息粗筛，无关日志不会格式化后送入处理器
+                self.handler_id = logger.add(
+                    self,
+                    level="INFO",
+                    filter=lambda r: "Heartbeat" in r["message"] or "获取新消息失败" in r["message"],
+                )
                 logger.info("已注册心跳失败日志处理器")
                 
             def unregister(self):
                 # 移除日志处理器
                 if self.handler_id is not None:
                     logger.remove(self.handler_id)
+                    self.handler_id = None
                     # 不需要输出日志处理器移除的消息
                     # logger.info("已移除心跳失败日志处理器")
         
@@ -1185,21 +1509,20 @@ class SMSNotifier(PluginBase):
             # 检查是否达到阈值
             if len(failure_count[wxid]) >= self.heartbeat_threshold:
                 # 检查上次通知时间
-                if wxid not in last_notification_time or current_time - last_notification_time[wxid] >= 3600:
+                if await self._should_notify(wxid):
                     logger.warning(f"用户 {wxid} 心跳失败次数达到阈值，发送通知")
                     
                     # 发送通知
                     success = await self._send_pushplus_notification(wxid)
                     if success:
-                        last_notification_time[wxid] = current_time
                         logger.info(f"已向用户 {wxid} 发送离线通知")
                         # 重置失败计数
                         failure_count[wxid] = []
                     else:
+                        await self._clear_notified(wxid)
                         logger.error(f"向用户 {wxid} 发送通知失败")
                 else:
-                    time_diff = current_time - last_notification_time[wxid]
-                    logger.info(f"用户 {wxid} 距离上次通知仅 {time_diff/60:.1f} 分钟，暂不重复发送")
+                    logger.info(f"用户 {wxid} 距离上次通知不足1小时，暂不重复发送")
         
         # 给回调函数添加对current_wxid的访问
         heartbeat_failure_callback.current_wxid = self.current_wxid
@@ -1209,49 +1532,51 @@ class SMSNotifier(PluginBase):
         log_handler.register()
         
         try:
-            # 主循环
+            # 主循环，按截止时间调度，避免探测耗时累积漂移
+            next_deadline = time.monotonic()
             while self.enable:
+                healthy = False
                 try:
                     # 更新回调函数的current_wxid（可能已更改）
                     heartbeat_failure_callback.current_wxid = self.current_wxid
                     
                     # 检查API服务状态
                     try:
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(f"{api_base_url}/IsRunning", timeout=5) as response:
-                                if response.status == 200:
-                                    result_text = await response.text()
-                                    # 不输出正常的API状态检查结果
-                                    # logger.info(f"API运行状态检查结果: {result_text}")
-                                    
-                                    # 服务不在运行时发送通知
-                                    if result_text.strip().lower() != "ok":
-                                        current_time = time.time()
-                                        logger.warning("API服务异常，状态检查返回非OK")
-                                        
-                                        for wxid in self.users:
-                                            if wxid not in last_notification_time or current_time - last_notification_time[wxid] >= 3600:
-                                                logger.warning(f"API异常，发送通知给用户 {wxid}")
-                                                await self._process_heartbeat_failure(wxid)
-                                                last_notification_time[wxid] = current_time
-                                else:
-                                    logger.warning(f"API服务状态检查失败，状态码: {response.status}")
-                                    current_time = time.time()
-                                    
-                                    # 服务不可用时发送通知
-                                    for wxid in self.users:
-                                        if wxid not in last_notification_time or current_time - last_notification_time[wxid] >= 3600:
-                                            logger.warning(f"API服务不可用，发送通知给用户 {wxid}")
-                                            await self._process_heartbeat_failure(wxid)
-                                            last_notification_time[wxid] = current_time
+                        down_reason = None
+                        session = await self._ensure_session()
+                        async with session.get(f"{api_base_url}/IsRunning", timeout=5) as response:
+                            if response.status == 200:
+                                result_text = await response.text()
+                                # 不输出正常的API状态检查结果
+                                # logger.info(f"API运行状态检查结果: {result_text}")
+                                
+                                # 服务不在运行时发送通知
+                                healthy = result_text.strip().lower() == "ok"
+                                if not healthy:
+                                    logger.warning("API服务异常，状态检查返回非OK")
+                                    down_reason = "API异常"
+                            else:
+                                logger.warning(f"API服务状态检查失败，状态码: {response.status}")
+                                down_reason = "API服务不可用"
+                        
+                        # 释放探测连接后再并发通知所有用户
+                        if down_reason:
+                            await self._notify_users_concurrently(down_reason)
                     except Exception as e:
                         logger.error(f"API状态检查请求失败: {e}")
                         
                 except Exception as e:
                     logger.error(f"API状态检查循环出错: {e}")
                 
-                # 每2秒检查一次
-                await asyncio.sleep(2)
+                # 健康时逐步放宽探测间隔，异常时立即缩短
+                if healthy:
+                    self._probe_interval = min(self._probe_interval * 2, _PROBE_HEALTHY_INTERVAL)
+                else:
+                    self._probe_interval = _PROBE_DEGRADED_INTERVAL
+                
+                now = time.monotonic()
+                next_deadline = max(next_deadline + self._probe_interval, now)
+                await asyncio.sleep(next_deadline - now)
         finally:
             # 确保日志处理器被移除
             log_handler.unregister()
@@ -1270,27 +1595,8 @@ class SMSNotifier(PluginBase):
                 return False
         return False
 
-    @on_text_message(priority=20)
-    async def handle_unmonitor_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_unmonitor(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理移除监控用户命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_unmonitor "):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
-        parts = content.split()
-        
         if len(parts) < 2:
             await bot.send_text_message(message["FromWxid"], "用法: sms_unmonitor <wxid>")
             return
@@ -1302,35 +1608,20 @@ class SMSNotifier(PluginBase):
             return
         
         del self.users[wxid]
+        self._refresh_sole_user()
         # 如果用户在离线列表中，也一同移除
         if wxid in self.offline_users:
             self.offline_users.remove(wxid)
         
         await bot.send_text_message(message["FromWxid"], f"已成功将用户 {wxid} 从监控列表中移除")
 
-    @on_text_message(priority=20)
-    async def handle_message_template_command(self, bot: WechatAPIClient, message: dict):
+    async def _do_template(self, bot: WechatAPIClient, message: dict, parts: List[str]):
         """处理设置消息模板命令"""
-        # 保存bot引用
-        self.bot = bot
-        
-        if not self.enable:
-            return
-            
-        content = message.get("Content", "").strip()
-        if not content.startswith("sms_template "):
-            return
-            
-        # 检查发送者是否为管理员
-        sender = message.get("SenderWxid", "")
-        if not await self.is_admin(bot, sender):
-            await bot.send_text_message(message["FromWxid"], "您没有权限执行此命令")
-            return
-        
         # 分析命令部分
         try:
             # 解析命令参数
-            parts = content.split(maxsplit=2)  # 最多分成3部分
+            # 模板内容可能包含空格，按原文重新切分，最多分成3部分
+            parts = message.get("Content", "").strip().split(maxsplit=2)
             
             if len(parts) < 3:
                 await bot.send_text_message(message["FromWxid"], "用法: \nsms_template title 新标题模板\nsms_template content 新内容模板\n\n可用变量: {wxid}, {time}, {date}, {hour}, {bot_name}, {bot_wxid}")
@@ -1355,93 +1646,38 @@ class SMSNotifier(PluginBase):
             else:
                 await bot.send_text_message(message["FromWxid"], f"未知的模板类型: {template_type}\n支持的类型: title, content, test_title, test_content")
             
+            # 模板已变更，重新拆分模板
+            self._compile_templates()
+            
             # 显示示例效果
             example = self._format_message_template(template_content, self.current_wxid)
             await bot.send_text_message(message["FromWxid"], f"模板示例效果:\n{example}")
             
             # 保存到配置文件
-            self._save_message_templates()
+            await self._save_message_templates()
             
         except Exception as e:
             logger.error(f"处理消息模板命令出错: {str(e)}")
             await bot.send_text_message(message["FromWxid"], f"设置消息模板失败: {str(e)}")
     
-    def _save_message_templates(self):
+    async def _save_message_templates(self):
         """保存消息模板到配置文件"""
         try:
-            config_path = os.path.join(os.path.dirname(__file__), "config.toml")
-            
             # 如果配置文件不存在，无法保存
-            if not os.path.exists(config_path):
+            if not os.path.exists(self._config_path):
                 logger.error("配置文件不存在，无法保存消息模板")
                 return False
                 
-            # 读取现有配置
-            with open(config_path, "rb") as f:
-                config_data = tomllib.load(f)
-            
-            # 更新消息模板部分
-            if "message" not in config_data:
-                config_data["message"] = {}
-                
-            config_data["message"]["title_template"] = self.title_template
-            config_data["message"]["content_template"] = self.content_template
-            config_data["message"]["test_title_template"] = self.test_title_template
-            config_data["message"]["test_content_template"] = self.test_content_template
-            
-            # 写回配置文件
-            with open(config_path, "w", encoding="utf-8") as f:
-                # 手动构建TOML格式，因为Python的tomllib只支持读取
-                # 基础部分
-                if "basic" in config_data:
-                    f.write("[basic]\n")
-                    for key, value in config_data["basic"].items():
-                        if isinstance(value, bool):
-                            f.write(f'{key} = {str(value).lower()}\n')
-                        elif isinstance(value, (int, float)):
-                            f.write(f'{key} = {value}\n')
-                        else:
-                            f.write(f'{key} = "{value}"\n')
-                    f.write("\n")
-                
-                # PushPlus部分
-                if "pushplus" in config_data:
-                    f.write("[pushplus]\n")
-                    for key, value in config_data["pushplus"].items():
-                        if isinstance(value, bool):
-                            f.write(f'{key} = {str(value).lower()}\n')
-                        elif isinstance(value, (int, float)):
-                            f.write(f'{key} = {value}\n')
-                        else:
-                            f.write(f'{key} = "{value}"\n')
-                    f.write("\n")
-                
-                # 通知配置部分
-                if "notification" in config_data:
-                    f.write("[notification]\n")
-                    for key, value in config_data["notification"].items():
-                        if isinstance(value, bool):
-                            f.write(f'{key} = {str(value).lower()}\n')
-                        elif isinstance(value, (int, float)):
-                            f.write(f'{key} = {value}\n')
-                        else:
-                            f.write(f'{key} = "{value}"\n')
-                    f.write("\n")
-                
-                # 消息模板部分
-                f.write("[message]\n")
-                f.write(f'title_template = "{self.title_template}"\n')
-                f.write(f'content_template = "{self.content_template}"\n')
-                f.write(f'test_title_template = "{self.test_title_template}"\n')
-                f.write(f'test_content_template = "{self.test_content_template}"\n')
-                f.write("\n")
-                
-                # 用户配置部分
-                if "users" in config_data:
-                    f.write("[users]\n")
-                    for user, value in config_data["users"].items():
-                        f.write(f'"{user}" = "{value}"\n')
-                
+            # 读取现有配置，只替换消息模板部分后整体写回，其余分区原样保留
+            config_data = await asyncio.to_thread(self._read_config_sync, self._config_path)
+            message_config = config_data.setdefault("message", {})
+            message_config["title_template"] = self.title_template
+            message_config["content_template"] = self.content_template
+            message_config["test_title_template"] = self.test_title_template
+            message_config["test_content_template"] = self.test_content_template
+            
+            await asyncio.to_thread(self._write_config_sync, self._config_path, config_data)
+
             logger.info("已保存消息模板到配置文件")
             return True
             
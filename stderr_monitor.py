@@ -1,4 +1,4 @@
-
+import atexit
 import sys
 import time
 import os
@@ -6,27 +6,34 @@ import os
 # 监控错误文件路径
 error_path = os.path.join(os.path.dirname(__file__), "heartbeat_errors.txt")
 
+# 心跳失败关键字
+KEYS = ("Heartbeat failed", "用户可能退出")
+
 # 记录上次大小
 last_size = 0
 if os.path.exists(error_path):
     last_size = os.path.getsize(error_path)
 
+# 错误文件只打开一次，O_APPEND保证每行一次原子追加；打不开时仍继续转发stderr
+try:
+    error_fd = os.open(error_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    atexit.register(os.close, error_fd)
+except OSError:
+    error_fd = None
+
 while True:
+    # readline本身会阻塞等待数据，无需额外休眠
     line = sys.stdin.readline()
     if not line:
         break
         
     # 检查是否有心跳失败
-    if "Heartbeat failed" in line or "用户可能退出" in line:
+    if error_fd is not None and any(k in line for k in KEYS):
         try:
-            with open(error_path, "a") as f:
-                f.write(f"stderr检测到心跳失败: {time.strftime('%Y-%m-%d %H:%M:%S')} - {line}")
-        except:
+            os.write(error_fd, f"stderr检测到心跳失败: {time.strftime('%Y-%m-%d %H:%M:%S')} - {line}".encode())
+        except OSError:
             pass
             
     # 刷新到标准错误，以便原始日志系统仍能记录
     sys.stderr.write(line)
     sys.stderr.flush()
-    
-    # 休眠一小段时间减少CPU使用
-    time.sleep(0.1)